@@ -1,13 +1,24 @@
 from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError
+from pymongo.write_concern import WriteConcern
+from bson.errors import InvalidDocument
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
 import os
+import json
+import orjson
+import asyncio
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
 import random
 
 ROOT_DIR = Path(__file__).parent
@@ -15,94 +26,516 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+client = None
+db = None
+
+# Redis cache for frequently polled reads (disabled when REDIS_URL is unset)
+redis_url = os.environ.get('REDIS_URL')
+cache = None
+CACHE_TTL = 5  # seconds
+
+def connect_clients():
+    """Open the MongoDB and Redis clients for this process
+    
+    Called from the startup hook rather than at import time, so that under
+    gunicorn --preload each forked worker gets its own connection pools.
+    """
+    global client, db, cache
+    # The pool is per process: with several workers, maxPoolSize * workers must
+    # stay below the server's connection limit (net.maxIncomingConnections).
+    # zstd compression needs a MongoDB 4.2+ server and the zstandard package;
+    # otherwise the driver falls back to zlib.
+    client = AsyncIOMotorClient(
+        mongo_url,
+        maxPoolSize=200,
+        minPoolSize=20,
+        serverSelectionTimeoutMS=2000,
+        socketTimeoutMS=5000,
+        compressors="zstd,zlib",
+        retryWrites=True,
+        tz_aware=True
+    )
+    db = client[os.environ['DB_NAME']]
+    if redis_url:
+        cache = aioredis.from_url(redis_url)
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
 # Define Models
 class Alert(BaseModel):
-    id: str = Field(default_factory=lambda: str(datetime.utcnow().timestamp()))
+    id: str = Field(default_factory=lambda: uuid4().hex)
     type: str  # "emergency", "warning", "info"
     description: str
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=utcnow)
     acknowledged: bool = False
 
 class SystemStatus(BaseModel):
     current_status: str  # "SAFE", "WARNING", "EMERGENCY"
-    last_updated: datetime = Field(default_factory=datetime.utcnow)
+    last_updated: datetime = Field(default_factory=utcnow)
     description: Optional[str] = None
 
 class Event(BaseModel):
-    id: str = Field(default_factory=lambda: str(datetime.utcnow().timestamp()))
+    id: str = Field(default_factory=lambda: uuid4().hex)
     description: str
     event_type: str  # "alert", "status_change", "connection"
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=utcnow)
 
 class ConnectionStatus(BaseModel):
     is_connected: bool
-    last_ping: datetime = Field(default_factory=datetime.utcnow)
+    last_ping: datetime = Field(default_factory=utcnow)
 
 class AcknowledgeRequest(BaseModel):
     alert_id: str
 
+# Validate and serialize whole result lists in a single pydantic-core pass
+_alerts_adapter = TypeAdapter(List[Alert])
+_events_adapter = TypeAdapter(List[Event])
+
+def json_list_response(adapter: TypeAdapter, docs: list) -> Response:
+    return Response(
+        adapter.dump_json(adapter.validate_python(docs)),
+        media_type="application/json"
+    )
+
+# Simulated alerts, status and events must be durable before the response
+# is sent, so that a client reading right after the simulate call sees them
+# whichever worker serves the read. Their events therefore skip the
+# per-process write coalescer.
+MAJORITY = WriteConcern("majority")
+
+def majority(collection):
+    return collection.with_options(write_concern=MAJORITY)
+
+# Fixed _id for collections that only hold the current state
+SINGLETON_ID = "singleton"
+
+def replace_singleton(collection, model: BaseModel):
+    """Upsert model as the only document in collection"""
+    return collection.replace_one({"_id": SINGLETON_ID}, model.model_dump(), upsert=True)
+
+async def create_singleton(collection, model: BaseModel) -> bool:
+    """Store model as the singleton unless one exists; True if this call created it"""
+    try:
+        result = await collection.update_one(
+            {"_id": SINGLETON_ID},
+            {"$setOnInsert": model.model_dump()},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Another process created it at the same moment
+        return False
+    return result.upserted_id is not None
+
+# Seconds without a ping before the device counts as disconnected
+CONNECTION_TIMEOUT = 300
+
+# Simulation messages
+_WARNINGS = (
+    "Warning: Obstacle detected ahead",
+    "Warning: Battery level low (20%)",
+    "Warning: Unusual movement pattern detected"
+)
+_SAFE_DESCRIPTION = "All systems operating normally"
+
+# Event write coalescing
+# Nearly every endpoint logs an event, so instead of one insert per request
+# events are queued and flushed together with insert_many shortly after.
+EVENT_FLUSH_DELAY = 0.02  # seconds
+EVENT_RETRY_DELAY = 1  # seconds
+EVENT_BATCH_SIZE = 100
+MAX_EVENT_BYTES = 64 * 1024
+EVENT_SHUTDOWN_TIMEOUT = 10  # seconds
+
+_event_queue: List[dict] = []
+_event_flush_task: Optional[asyncio.Task] = None
+_event_batch_full: Optional[asyncio.Event] = None  # created on first use, inside the event loop
+
+async def _flush_events():
+    """Write all queued events in a single insert_many
+    
+    On failure the unwritten events are put back at the front of the queue.
+    insert_many assigns each document its _id before sending, so a retry of
+    an event that did reach the server fails with a duplicate key and is
+    treated as written.
+    """
+    if not _event_queue:
+        return
+    batch = _event_queue[:]
+    _event_queue.clear()
+    try:
+        await db.events.insert_many(batch, ordered=False)
+    except BulkWriteError as e:
+        failed = [
+            batch[error["index"]]
+            for error in e.details["writeErrors"]
+            if error["code"] != 11000
+        ]
+        if failed:
+            _event_queue[:0] = failed
+            raise
+    except InvalidDocument:
+        # Some event can't be encoded (e.g. DocumentTooLarge); find it by
+        # writing the batch one by one so the rest are kept
+        await _insert_events_one_by_one(batch)
+    except PyMongoError:
+        _event_queue[:0] = batch
+        raise
+
+async def _insert_events_one_by_one(batch: List[dict]):
+    for i, doc in enumerate(batch):
+        try:
+            await db.events.insert_one(doc)
+        except DuplicateKeyError:
+            # Already written by the failed insert_many
+            pass
+        except InvalidDocument:
+            logger.error("Dropping event that cannot be stored: %r", doc.get("id"), exc_info=True)
+        except PyMongoError:
+            _event_queue[:0] = batch[i:]
+            raise
+
+async def _flush_events_later():
+    # Wait out the coalescing window, cut short once a full batch is queued
+    try:
+        await asyncio.wait_for(_event_batch_full.wait(), EVENT_FLUSH_DELAY)
+    except asyncio.TimeoutError:
+        pass
+    
+    # Keep going until everything is written, including events queued
+    # during the flush and batches put back after a failed insert
+    while _event_queue:
+        _event_batch_full.clear()
+        try:
+            await _flush_events()
+        except PyMongoError:
+            logger.exception("Failed to flush %d queued events, retrying", len(_event_queue))
+            await asyncio.sleep(EVENT_RETRY_DELAY)
+
+async def queue_event(event: Event):
+    """Queue an event for the next batched insert"""
+    global _event_flush_task, _event_batch_full
+    if _event_batch_full is None:
+        _event_batch_full = asyncio.Event()
+    _event_queue.append(event.model_dump())
+    if len(_event_queue) >= EVENT_BATCH_SIZE:
+        _event_batch_full.set()
+    if _event_flush_task is None or _event_flush_task.done():
+        _event_flush_task = asyncio.create_task(_flush_events_later())
+
+# Read-through cache
+async def cached(key: str, ttl: int, fetch_fn):
+    """Return the cached value for key, or fetch it and cache it for ttl seconds"""
+    if cache is None:
+        return await fetch_fn()
+    try:
+        hit = await cache.get(key)
+        if hit is not None:
+            return json.loads(hit)
+    except RedisError:
+        logger.warning("Cache read failed for %s", key, exc_info=True)
+        return await fetch_fn()
+    
+    value = await fetch_fn()
+    if isinstance(value, BaseModel):
+        payload = value.model_dump_json()
+    else:
+        payload = json.dumps(jsonable_encoder(value))
+    try:
+        await cache.set(key, payload, ex=ttl)
+    except RedisError:
+        logger.warning("Cache write failed for %s", key, exc_info=True)
+    return value
+
+async def invalidate(*keys: str):
+    """Drop cached values so the next read goes to the database"""
+    if cache is None:
+        return
+    try:
+        await cache.delete(*keys)
+    except RedisError:
+        logger.warning("Cache invalidation failed for %s", keys, exc_info=True)
+
+# Latest unacknowledged alert
+# A copy of the newest unacknowledged alert is kept in a single pointer
+# document, so polling /alerts/latest is a primary-key lookup.
+LATEST_ALERT_ID = "latest_unacknowledged"
+
+async def _set_latest_alert(alert: dict):
+    """Point at alert unless the pointer already holds a newer one"""
+    try:
+        await majority(db.latest_alert).replace_one(
+            {"_id": LATEST_ALERT_ID, "timestamp": {"$lt": alert["timestamp"]}},
+            alert,
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The pointer exists but did not match: it names a newer alert
+        pass
+
+async def insert_alert(alert: Alert):
+    """Store alert, then point the latest-alert pointer at it"""
+    # Only once the insert succeeded, so the pointer never names a missing alert
+    await majority(db.alerts).insert_one(alert.model_dump())
+    await _set_latest_alert(alert.model_dump())
+
+async def _find_latest_unacknowledged():
+    return await db.alerts.find_one(
+        {"acknowledged": False},
+        {"_id": 0},
+        sort=[("timestamp", -1)]
+    )
+
+async def _refresh_latest_alert(replacing: str):
+    """Re-point at the newest unacknowledged alert, or clear the pointer
+    
+    The pointer is only touched while it still names the replaced alert,
+    so a newer alert set in the meantime is kept.
+    """
+    pointer_filter = {"_id": LATEST_ALERT_ID, "id": replacing}
+    alert = await _find_latest_unacknowledged()
+    if alert:
+        await db.latest_alert.replace_one(pointer_filter, alert)
+    else:
+        await db.latest_alert.delete_one(pointer_filter)
+
+async def _repair_latest_alert():
+    """Bring the pointer up to date at startup without undoing concurrent writes
+    
+    Other workers may be serving requests already, so the pointer is only
+    moved forward in time, or away from the exact alert that was read here
+    as acknowledged.
+    """
+    pointer = await db.latest_alert.find_one({"_id": LATEST_ALERT_ID}, {"id": 1})
+    if pointer is not None:
+        still_open = await db.alerts.find_one(
+            {"id": pointer["id"], "acknowledged": False},
+            {"_id": 1}
+        )
+        if still_open is None:
+            await _refresh_latest_alert(replacing=pointer["id"])
+            return
+    
+    alert = await _find_latest_unacknowledged()
+    if alert:
+        await _set_latest_alert(alert)
+
+# Server-sent events
+# Each process tails one change stream per collection and fans every change
+# out to its subscribers' queues, so database load doesn't grow with clients.
+SSE_KEEPALIVE_INTERVAL = 15  # seconds; idle streams send a comment so proxies keep them open
+SSE_QUEUE_SIZE = 100  # messages buffered per subscriber before it is dropped
+CHANGE_FEED_RETRY_DELAY = 5  # seconds
+CHANGE_STREAMS_UNSUPPORTED = 40573  # error code on a standalone server
+
+def _sse_data(doc: Optional[dict]) -> bytes:
+    if doc is not None:
+        doc.pop("_id", None)
+    return b"data: " + orjson.dumps(doc) + b"\n\n"
+
+class ChangeFeed:
+    """A change stream on one collection, shared by all SSE subscribers"""
+    
+    def __init__(self, collection_name: str, pipeline: list):
+        self.collection_name = collection_name
+        self.pipeline = pipeline
+        self.subscribers: set = set()
+        self.available = True
+        self._resume_token = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        self._close_subscribers()
+    
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SSE_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        return queue
+    
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+    
+    def _publish(self, message: bytes):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Too slow to keep up; the client reconnects and starts over
+                self.unsubscribe(queue)
+    
+    def _close_subscribers(self):
+        subscribers, self.subscribers = self.subscribers, set()
+        for queue in subscribers:
+            try:
+                queue.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+    
+    async def _run(self):
+        while True:
+            try:
+                async with db[self.collection_name].watch(
+                    self.pipeline, resume_after=self._resume_token
+                ) as stream:
+                    async for change in stream:
+                        self._resume_token = stream.resume_token
+                        self._publish(_sse_data(change.get("fullDocument")))
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAMS_UNSUPPORTED:
+                    logger.warning("Change streams need a replica set; %s stream disabled", self.collection_name)
+                    self.available = False
+                    self._close_subscribers()
+                    return
+                # The server rejected the stream, possibly the resume token
+                # itself, so start again from the present
+                self._resume_token = None
+                logger.exception("Change stream on %s failed, reopening", self.collection_name)
+            except PyMongoError:
+                logger.exception("Change stream on %s failed, reopening", self.collection_name)
+            await asyncio.sleep(CHANGE_FEED_RETRY_DELAY)
+
+events_feed = ChangeFeed("events", [{"$match": {"operationType": "insert"}}])
+latest_alert_feed = ChangeFeed(
+    "latest_alert",
+    [{"$match": {"operationType": {"$in": ["insert", "replace", "delete"]}}}]
+)
+
+async def sse_response(feed: ChangeFeed, current=None) -> StreamingResponse:
+    """Stream feed to the client as server-sent events
+    
+    If given, current is awaited after subscribing and its result is sent
+    first, so new subscribers start from the present state.
+    """
+    if not feed.available:
+        raise HTTPException(status_code=503, detail="Change streams require a replica set")
+    queue = feed.subscribe()
+    try:
+        initial = await current() if current is not None else None
+    except Exception:
+        feed.unsubscribe(queue)
+        raise
+    
+    async def generate():
+        try:
+            if current is not None:
+                yield _sse_data(initial)
+            while queue in feed.subscribers:
+                try:
+                    message = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    message = b": keep-alive\n\n"
+                if message is None:
+                    break
+                yield message
+        finally:
+            feed.unsubscribe(queue)
+    
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Initialize with default data
 async def initialize_default_data():
-    # Check if data exists
-    status_count = await db.system_status.count_documents({})
-    if status_count == 0:
-        # Create default status
-        default_status = SystemStatus(
-            current_status="SAFE",
-            description="All systems operating normally"
-        )
-        await db.system_status.insert_one(default_status.dict())
-        
+    # Indexes backing the sorted/filtered reads (no-ops if they already exist)
+    await asyncio.gather(
+        db.alerts.create_index([("timestamp", -1)]),
+        db.alerts.create_index([("acknowledged", 1), ("timestamp", -1)]),
+        db.alerts.create_index("id", unique=True),
+        db.events.create_index([("timestamp", -1)])
+    )
+    # An earlier version expired the connection document with a TTL index,
+    # which also threw away the last known ping
+    try:
+        await db.connection_status.drop_index("last_ping_1")
+    except OperationFailure:
+        pass
+    await _repair_latest_alert()
+    
+    # Check if the current status exists
+    if await db.system_status.find_one({"_id": SINGLETON_ID}, {"_id": 1}):
+        return
+    
+    # Older deployments appended a row per status change; carry the newest
+    # one over so an upgrade doesn't reset the reported status
+    latest_status = await db.system_status.find_one(
+        {"_id": {"$ne": SINGLETON_ID}},
+        {"_id": 0},
+        sort=[("last_updated", -1)]
+    )
+    if latest_status:
+        await create_singleton(db.system_status, SystemStatus(**latest_status))
+        return
+    
+    # Every worker runs this at startup; only the one whose insert creates
+    # the default status goes on to seed the rest
+    now = utcnow()
+    default_status = SystemStatus(
+        current_status="SAFE",
+        description=_SAFE_DESCRIPTION,
+        last_updated=now
+    )
+    if await create_singleton(db.system_status, default_status):
         # Create default connection status
-        default_connection = ConnectionStatus(is_connected=True)
-        await db.connection_status.insert_one(default_connection.dict())
+        default_connection = ConnectionStatus(is_connected=True, last_ping=now)
+        await create_singleton(db.connection_status, default_connection)
         
         # Create some initial events
         events = [
             Event(
                 description="System initialized",
                 event_type="status_change",
-                timestamp=datetime.utcnow() - timedelta(hours=2)
+                timestamp=now - timedelta(hours=2)
             ),
             Event(
                 description="Device connected successfully",
                 event_type="connection",
-                timestamp=datetime.utcnow() - timedelta(hours=1, minutes=30)
+                timestamp=now - timedelta(hours=1, minutes=30)
             )
         ]
-        for event in events:
-            await db.events.insert_one(event.dict())
+        await db.events.insert_many([event.model_dump() for event in events])
 
 @app.on_event("startup")
 async def startup_event():
+    connect_clients()
     await initialize_default_data()
+    events_feed.start()
+    latest_alert_feed.start()
 
 # Alert endpoints
-@api_router.get("/alerts", response_model=List[Alert])
+# Response schemas are declared via responses= rather than response_model=,
+# so they appear in the OpenAPI docs without FastAPI re-validating and
+# re-serializing what the handlers already return
+@api_router.get("/alerts", responses={200: {"model": List[Alert]}})
 async def get_alerts():
     """Get all alerts, sorted by timestamp descending"""
-    alerts = await db.alerts.find().sort("timestamp", -1).limit(50).to_list(50)
-    return [Alert(**alert) for alert in alerts]
+    cursor = db.alerts.find({}, {"_id": 0}).sort("timestamp", -1).limit(50)
+    return json_list_response(_alerts_adapter, await cursor.to_list(50))
+
+async def _fetch_latest_alert():
+    return await db.latest_alert.find_one({"_id": LATEST_ALERT_ID}, {"_id": 0})
 
-@api_router.get("/alerts/latest")
+@api_router.get("/alerts/latest", deprecated=True, responses={200: {"model": Optional[Alert]}})
 async def get_latest_alert():
-    """Get the latest unacknowledged alert"""
-    alert = await db.alerts.find_one(
-        {"acknowledged": False},
-        sort=[("timestamp", -1)]
-    )
-    if alert:
-        return Alert(**alert)
-    return None
+    """Get the latest unacknowledged alert (prefer /alerts/stream over polling)"""
+    return await cached("latest_alert", CACHE_TTL, _fetch_latest_alert)
+
+@api_router.get("/alerts/stream")
+async def stream_latest_alert():
+    """Stream the latest unacknowledged alert, starting with the current one; null once none is left"""
+    return await sse_response(latest_alert_feed, current=_fetch_latest_alert)
 
 @api_router.post("/alerts/acknowledge")
 async def acknowledge_alert(request: AcknowledgeRequest):
@@ -114,78 +547,98 @@ async def acknowledge_alert(request: AcknowledgeRequest):
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Alert not found")
     
+    # Move the pointer on if it was pointing at this alert
+    await _refresh_latest_alert(replacing=request.alert_id)
+    
     # Add event for acknowledgement
     event = Event(
         description=f"Alert acknowledged",
         event_type="alert"
     )
-    await db.events.insert_one(event.dict())
+    await asyncio.gather(
+        queue_event(event),
+        invalidate("latest_alert")
+    )
     
     return {"success": True, "message": "Alert acknowledged"}
 
 # Status endpoints
-@api_router.get("/status")
-async def get_status():
-    """Get current system status"""
-    status = await db.system_status.find_one(sort=[("last_updated", -1)])
+async def _fetch_status():
+    status = await db.system_status.find_one({"_id": SINGLETON_ID}, {"_id": 0})
     if status:
         return SystemStatus(**status)
     return SystemStatus(current_status="SAFE")
 
+@api_router.get("/status", responses={200: {"model": SystemStatus}})
+async def get_status():
+    """Get current system status"""
+    return await cached("status", CACHE_TTL, _fetch_status)
+
 @api_router.post("/status")
 async def update_status(status: SystemStatus):
     """Update system status (for simulation)"""
-    await db.system_status.insert_one(status.dict())
-    
     # Add event for status change
     event = Event(
         description=f"Status changed to {status.current_status}",
         event_type="status_change"
     )
-    await db.events.insert_one(event.dict())
+    await asyncio.gather(
+        replace_singleton(db.system_status, status),
+        queue_event(event)
+    )
+    await invalidate("status")
     
     return status
 
 # Event endpoints
-@api_router.get("/events", response_model=List[Event])
+@api_router.get("/events", deprecated=True, responses={200: {"model": List[Event]}})
 async def get_events():
-    """Get event log, sorted by timestamp descending"""
-    events = await db.events.find().sort("timestamp", -1).limit(100).to_list(100)
-    return [Event(**event) for event in events]
+    """Get event log, sorted by timestamp descending (prefer /events/stream over polling)"""
+    cursor = db.events.find({}, {"_id": 0}).sort("timestamp", -1).limit(100)
+    return json_list_response(_events_adapter, await cursor.to_list(100))
+
+@api_router.get("/events/stream")
+async def stream_events():
+    """Stream newly logged events"""
+    return await sse_response(events_feed)
 
 @api_router.post("/events")
 async def add_event(event: Event):
     """Add event to log (for simulation)"""
-    await db.events.insert_one(event.dict())
+    if len(event.model_dump_json()) > MAX_EVENT_BYTES:
+        raise HTTPException(status_code=413, detail="Event too large")
+    await queue_event(event)
     return event
 
 # Connection endpoints
-@api_router.get("/connection")
-async def get_connection_status():
-    """Get device connection status"""
-    connection = await db.connection_status.find_one(sort=[("last_ping", -1)])
+async def _fetch_connection_status():
+    connection = await db.connection_status.find_one({"_id": SINGLETON_ID}, {"_id": 0})
     if connection:
-        # Check if last ping was within last 5 minutes
-        last_ping = connection.get('last_ping')
-        if isinstance(last_ping, datetime):
-            time_diff = datetime.utcnow() - last_ping
-            is_connected = time_diff < timedelta(minutes=5)
-            connection['is_connected'] = is_connected
+        # Keep reporting the real last ping once the device has gone quiet
+        if connection["last_ping"] < utcnow() - timedelta(seconds=CONNECTION_TIMEOUT):
+            connection["is_connected"] = False
         return ConnectionStatus(**connection)
     return ConnectionStatus(is_connected=False)
 
+@api_router.get("/connection", responses={200: {"model": ConnectionStatus}})
+async def get_connection_status():
+    """Get device connection status"""
+    return await cached("connection", CACHE_TTL, _fetch_connection_status)
+
 @api_router.post("/connection")
 async def update_connection(connection: ConnectionStatus):
     """Update connection status"""
-    await db.connection_status.insert_one(connection.dict())
-    
     # Add event for connection change
     event_desc = "Device connected" if connection.is_connected else "Device disconnected"
     event = Event(
         description=event_desc,
         event_type="connection"
     )
-    await db.events.insert_one(event.dict())
+    await asyncio.gather(
+        replace_singleton(db.connection_status, connection),
+        queue_event(event)
+    )
+    await invalidate("connection")
     
     return connection
 
@@ -193,74 +646,93 @@ async def update_connection(connection: ConnectionStatus):
 @api_router.post("/simulate/emergency")
 async def simulate_emergency():
     """Simulate an emergency alert"""
+    # One timestamp for the alert, status and event written together
+    now = utcnow()
     alert = Alert(
         type="emergency",
-        description="Emergency: User needs immediate assistance"
+        description="Emergency: User needs immediate assistance",
+        timestamp=now
     )
-    await db.alerts.insert_one(alert.dict())
     
     # Update status to emergency
     status = SystemStatus(
         current_status="EMERGENCY",
-        description="Emergency alert triggered"
+        description="Emergency alert triggered",
+        last_updated=now
     )
-    await db.system_status.insert_one(status.dict())
     
     # Add event
     event = Event(
         description="EMERGENCY ALERT: Immediate assistance required",
-        event_type="alert"
+        event_type="alert",
+        timestamp=now
     )
-    await db.events.insert_one(event.dict())
+    
+    # The writes target different collections, so issue them concurrently
+    await asyncio.gather(
+        insert_alert(alert),
+        replace_singleton(majority(db.system_status), status),
+        majority(db.events).insert_one(event.model_dump())
+    )
+    await invalidate("status", "latest_alert")
     
     return {"success": True, "alert": alert}
 
 @api_router.post("/simulate/warning")
 async def simulate_warning():
     """Simulate a warning alert"""
-    warnings = [
-        "Warning: Obstacle detected ahead",
-        "Warning: Battery level low (20%)",
-        "Warning: Unusual movement pattern detected"
-    ]
-    
+    now = utcnow()
     alert = Alert(
         type="warning",
-        description=random.choice(warnings)
+        description=random.choice(_WARNINGS),
+        timestamp=now
     )
-    await db.alerts.insert_one(alert.dict())
     
     # Update status to warning
     status = SystemStatus(
         current_status="WARNING",
-        description="Warning condition detected"
+        description="Warning condition detected",
+        last_updated=now
     )
-    await db.system_status.insert_one(status.dict())
     
     # Add event
     event = Event(
         description=alert.description,
-        event_type="alert"
+        event_type="alert",
+        timestamp=now
     )
-    await db.events.insert_one(event.dict())
+    
+    await asyncio.gather(
+        insert_alert(alert),
+        replace_singleton(majority(db.system_status), status),
+        majority(db.events).insert_one(event.model_dump())
+    )
+    await invalidate("status", "latest_alert")
     
     return {"success": True, "alert": alert}
 
 @api_router.post("/simulate/safe")
 async def simulate_safe():
     """Set status back to safe"""
+    now = utcnow()
     status = SystemStatus(
         current_status="SAFE",
-        description="All systems operating normally"
+        description=_SAFE_DESCRIPTION,
+        last_updated=now
     )
-    await db.system_status.insert_one(status.dict())
     
     # Add event
     event = Event(
         description="System status returned to normal",
-        event_type="status_change"
+        event_type="status_change",
+        timestamp=now
     )
-    await db.events.insert_one(event.dict())
+    
+    await asyncio.gather(
+        replace_singleton(majority(db.system_status), status),
+        majority(db.events).insert_one(event.model_dump())
+    )
+    await invalidate("status")
     
     return {"success": True, "status": status}
 
@@ -288,4 +760,28 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await asyncio.gather(events_feed.stop(), latest_alert_feed.stop())
+    
+    # Let the background flush write everything still queued or in flight,
+    # retries included, before the client goes away
+    if _event_flush_task is not None and not _event_flush_task.done():
+        _event_batch_full.set()
+        try:
+            await asyncio.wait_for(_event_flush_task, EVENT_SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.error("Dropping %d queued events on shutdown", len(_event_queue))
     client.close()
+    if cache is not None:
+        await cache.aclose()
+
+if __name__ == "__main__":
+    import uvicorn
+    
+    uvicorn.run(
+        "server:app",
+        host="0.0.0.0",
+        port=int(os.environ.get('PORT', 8001)),
+        loop="auto",  # uvloop where installed (not on Windows)
+        http="httptools",
+        workers=int(os.environ.get('WEB_CONCURRENCY', 1))
+    )
@@ -4,9 +4,9 @@ KreoAssist Backend API Testing Suite
 Tests all caregiver monitoring API endpoints thoroughly
 """
 
-import requests
+import asyncio
+import httpx
 import json
-import time
 from datetime import datetime, timedelta
 from typing import Dict, Any, List
 import os
@@ -31,7 +31,16 @@ print(f"Testing backend at: {BASE_URL}")
 class KreoAssistTester:
     def __init__(self):
         self.base_url = BASE_URL
-        self.session = requests.Session()
+        # Shared pooled client; suites running concurrently reuse warm connections
+        # (limits go on the transport; the client ignores its own when given one)
+        self.client = httpx.AsyncClient(
+            base_url=BASE_URL,
+            timeout=10,
+            transport=httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=50),
+                retries=2
+            )
+        )
         self.test_results = []
         self.alert_ids = []  # Track created alert IDs for cleanup
         
@@ -48,37 +57,45 @@ class KreoAssistTester:
             'details': details
         })
         
-    def make_request(self, method: str, endpoint: str, data: Dict = None) -> tuple:
+    async def make_request(self, method: str, endpoint: str, data: Dict = None) -> tuple:
         """Make HTTP request and return (success, response_data, status_code)"""
-        url = f"{self.base_url}{endpoint}"
         try:
             if method.upper() == 'GET':
-                response = self.session.get(url, timeout=10)
+                response = await self.client.get(endpoint)
             elif method.upper() == 'POST':
-                response = self.session.post(url, json=data, timeout=10)
+                response = await self.client.post(endpoint, json=data)
             else:
                 return False, f"Unsupported method: {method}", 0
                 
             return True, response.json() if response.content else {}, response.status_code
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             return False, str(e), 0
         except json.JSONDecodeError as e:
             return False, f"JSON decode error: {e}", response.status_code if 'response' in locals() else 0
     
-    def test_root_endpoint(self):
+    async def wait_for_sse(self, response, predicate, timeout: float = 5):
+        """Return the first server-sent data payload matching predicate, or None if the stream ends"""
+        async def scan():
+            async for line in response.aiter_lines():
+                if line.startswith("data: "):
+                    data = json.loads(line[len("data: "):])
+                    if predicate(data):
+                        return data
+            return None
+        return await asyncio.wait_for(scan(), timeout)
+    
+    async def test_root_endpoint(self):
         """Test root API endpoint"""
-        success, data, status = self.make_request('GET', '/')
+        success, data, status = await self.make_request('GET', '/')
         if success and status == 200 and 'message' in data:
             self.log_test("Root endpoint", True, f"Message: {data.get('message', '')}")
         else:
             self.log_test("Root endpoint", False, f"Status: {status}, Data: {data}")
     
-    def test_status_endpoints(self):
+    async def test_status_endpoints(self):
         """Test system status endpoints"""
-        print("\n=== Testing Status Endpoints ===")
-        
         # Test GET /api/status
-        success, data, status = self.make_request('GET', '/status')
+        success, data, status = await self.make_request('GET', '/status')
         if success and status == 200:
             required_fields = ['current_status', 'last_updated']
             if all(field in data for field in required_fields):
@@ -93,7 +110,7 @@ class KreoAssistTester:
             "current_status": "WARNING",
             "description": "Test status update"
         }
-        success, data, status = self.make_request('POST', '/status', test_status)
+        success, data, status = await self.make_request('POST', '/status', test_status)
         if success and status == 200:
             if data.get('current_status') == 'WARNING':
                 self.log_test("POST /status", True, "Status updated successfully")
@@ -102,12 +119,10 @@ class KreoAssistTester:
         else:
             self.log_test("POST /status", False, f"Status: {status}, Data: {data}")
     
-    def test_connection_endpoints(self):
+    async def test_connection_endpoints(self):
         """Test connection status endpoints"""
-        print("\n=== Testing Connection Endpoints ===")
-        
         # Test GET /api/connection
-        success, data, status = self.make_request('GET', '/connection')
+        success, data, status = await self.make_request('GET', '/connection')
         if success and status == 200:
             required_fields = ['is_connected', 'last_ping']
             if all(field in data for field in required_fields):
@@ -121,7 +136,7 @@ class KreoAssistTester:
         test_connection = {
             "is_connected": True
         }
-        success, data, status = self.make_request('POST', '/connection', test_connection)
+        success, data, status = await self.make_request('POST', '/connection', test_connection)
         if success and status == 200:
             if 'is_connected' in data:
                 self.log_test("POST /connection", True, "Connection status updated")
@@ -130,12 +145,12 @@ class KreoAssistTester:
         else:
             self.log_test("POST /connection", False, f"Status: {status}, Data: {data}")
     
-    def test_alert_endpoints(self):
+    async def test_alert_endpoints(self):
         """Test alert management endpoints"""
         print("\n=== Testing Alert Endpoints ===")
         
         # Test GET /api/alerts (initially might be empty)
-        success, data, status = self.make_request('GET', '/alerts')
+        success, data, status = await self.make_request('GET', '/alerts')
         if success and status == 200:
             if isinstance(data, list):
                 self.log_test("GET /alerts", True, f"Retrieved {len(data)} alerts")
@@ -148,21 +163,21 @@ class KreoAssistTester:
             return
         
         # Test GET /api/alerts/latest (might be None initially)
-        success, data, status = self.make_request('GET', '/alerts/latest')
+        success, data, status = await self.make_request('GET', '/alerts/latest')
         if success and status == 200:
             self.log_test("GET /alerts/latest", True, f"Latest alert: {data}")
         else:
             self.log_test("GET /alerts/latest", False, f"Status: {status}, Data: {data}")
         
         # Create an alert via simulation to test acknowledgement
-        success, alert_data, status = self.make_request('POST', '/simulate/emergency')
+        success, alert_data, status = await self.make_request('POST', '/simulate/emergency')
         if success and status == 200 and 'alert' in alert_data:
             alert_id = alert_data['alert']['id']
             self.alert_ids.append(alert_id)
             
             # Test POST /api/alerts/acknowledge
             ack_request = {"alert_id": alert_id}
-            success, ack_data, status = self.make_request('POST', '/alerts/acknowledge', ack_request)
+            success, ack_data, status = await self.make_request('POST', '/alerts/acknowledge', ack_request)
             if success and status == 200:
                 if ack_data.get('success'):
                     self.log_test("POST /alerts/acknowledge", True, "Alert acknowledged successfully")
@@ -175,18 +190,16 @@ class KreoAssistTester:
         
         # Test acknowledging non-existent alert (edge case)
         fake_ack = {"alert_id": "non_existent_id_12345"}
-        success, data, status = self.make_request('POST', '/alerts/acknowledge', fake_ack)
+        success, data, status = await self.make_request('POST', '/alerts/acknowledge', fake_ack)
         if success and status == 404:
             self.log_test("Acknowledge non-existent alert", True, "Correctly returned 404")
         else:
             self.log_test("Acknowledge non-existent alert", False, f"Expected 404, got {status}")
     
-    def test_event_endpoints(self):
+    async def test_event_endpoints(self):
         """Test event log endpoints"""
-        print("\n=== Testing Event Endpoints ===")
-        
         # Test GET /api/events
-        success, data, status = self.make_request('GET', '/events')
+        success, data, status = await self.make_request('GET', '/events')
         if success and status == 200:
             if isinstance(data, list):
                 self.log_test("GET /events", True, f"Retrieved {len(data)} events")
@@ -208,7 +221,7 @@ class KreoAssistTester:
             "description": "Test event from automated testing",
             "event_type": "test"
         }
-        success, data, status = self.make_request('POST', '/events', test_event)
+        success, data, status = await self.make_request('POST', '/events', test_event)
         if success and status == 200:
             if 'description' in data and data['description'] == test_event['description']:
                 self.log_test("POST /events", True, "Event added successfully")
@@ -217,12 +230,12 @@ class KreoAssistTester:
         else:
             self.log_test("POST /events", False, f"Status: {status}, Data: {data}")
     
-    def test_simulation_endpoints(self):
+    async def test_simulation_endpoints(self):
         """Test simulation endpoints for demo purposes"""
         print("\n=== Testing Simulation Endpoints ===")
         
         # Test emergency simulation
-        success, data, status = self.make_request('POST', '/simulate/emergency')
+        success, data, status = await self.make_request('POST', '/simulate/emergency')
         if success and status == 200:
             if data.get('success') and 'alert' in data:
                 alert_id = data['alert']['id']
@@ -234,7 +247,7 @@ class KreoAssistTester:
             self.log_test("POST /simulate/emergency", False, f"Status: {status}, Data: {data}")
         
         # Test warning simulation
-        success, data, status = self.make_request('POST', '/simulate/warning')
+        success, data, status = await self.make_request('POST', '/simulate/warning')
         if success and status == 200:
             if data.get('success') and 'alert' in data:
                 alert_id = data['alert']['id']
@@ -246,7 +259,7 @@ class KreoAssistTester:
             self.log_test("POST /simulate/warning", False, f"Status: {status}, Data: {data}")
         
         # Test safe simulation
-        success, data, status = self.make_request('POST', '/simulate/safe')
+        success, data, status = await self.make_request('POST', '/simulate/safe')
         if success and status == 200:
             if data.get('success') and 'status' in data:
                 self.log_test("POST /simulate/safe", True, "Status set to safe")
@@ -255,12 +268,56 @@ class KreoAssistTester:
         else:
             self.log_test("POST /simulate/safe", False, f"Status: {status}, Data: {data}")
     
-    def test_data_flow_consistency(self):
+    async def test_stream_endpoints(self):
+        """Test server-sent event streams"""
+        print("\n=== Testing Stream Endpoints ===")
+        
+        # Test GET /api/alerts/stream starts with the current latest alert (or null)
+        try:
+            async with self.client.stream('GET', '/alerts/stream') as response:
+                if response.status_code == 503:
+                    self.log_test("GET /alerts/stream", True, "Change streams unavailable (MongoDB is not a replica set)")
+                elif response.status_code == 200:
+                    data = await self.wait_for_sse(response, lambda data: True)
+                    if data is None or 'id' in data:
+                        self.log_test("GET /alerts/stream", True, f"Initial state: {data.get('id') if data else None}")
+                    else:
+                        self.log_test("GET /alerts/stream", False, f"Unexpected initial message: {data}")
+                else:
+                    self.log_test("GET /alerts/stream", False, f"Status: {response.status_code}")
+        except (httpx.HTTPError, asyncio.TimeoutError) as e:
+            self.log_test("GET /alerts/stream", False, f"No initial message: {e!r}")
+        
+        # Test GET /api/events/stream pushes a newly added event
+        description = f"Stream test event {datetime.utcnow().isoformat()}"
+        try:
+            async with self.client.stream('GET', '/events/stream') as response:
+                if response.status_code == 503:
+                    self.log_test("GET /events/stream", True, "Change streams unavailable (MongoDB is not a replica set)")
+                elif response.status_code == 200:
+                    await self.make_request('POST', '/events', {
+                        "description": description,
+                        "event_type": "test"
+                    })
+                    data = await self.wait_for_sse(
+                        response,
+                        lambda data: data and data.get('description') == description
+                    )
+                    if data:
+                        self.log_test("GET /events/stream", True, "New event pushed to subscriber")
+                    else:
+                        self.log_test("GET /events/stream", False, "Stream ended before the new event arrived")
+                else:
+                    self.log_test("GET /events/stream", False, f"Status: {response.status_code}")
+        except (httpx.HTTPError, asyncio.TimeoutError) as e:
+            self.log_test("GET /events/stream", False, f"New event not pushed: {e!r}")
+    
+    async def test_data_flow_consistency(self):
         """Test data flow and consistency across endpoints"""
         print("\n=== Testing Data Flow Consistency ===")
         
         # Create emergency alert and verify it appears in all relevant endpoints
-        success, emergency_data, status = self.make_request('POST', '/simulate/emergency')
+        success, emergency_data, status = await self.make_request('POST', '/simulate/emergency')
         if not success or status != 200:
             self.log_test("Data flow test setup", False, "Could not create emergency for testing")
             return
@@ -268,11 +325,11 @@ class KreoAssistTester:
         alert_id = emergency_data['alert']['id']
         self.alert_ids.append(alert_id)
         
-        # Wait a moment for data to propagate
-        time.sleep(1)
-        
+        # The simulate call writes its alert, status and event with majority
+        # write concern before responding, so the reads below see them
+        # without waiting, whichever worker serves them
         # Check if status was updated to EMERGENCY
-        success, status_data, status = self.make_request('GET', '/status')
+        success, status_data, status = await self.make_request('GET', '/status')
         if success and status == 200:
             if status_data.get('current_status') == 'EMERGENCY':
                 self.log_test("Status consistency after emergency", True, "Status correctly updated to EMERGENCY")
@@ -280,7 +337,7 @@ class KreoAssistTester:
                 self.log_test("Status consistency after emergency", False, f"Status is {status_data.get('current_status')}, expected EMERGENCY")
         
         # Check if alert appears in alerts list
-        success, alerts_data, status = self.make_request('GET', '/alerts')
+        success, alerts_data, status = await self.make_request('GET', '/alerts')
         if success and status == 200:
             alert_found = any(alert['id'] == alert_id for alert in alerts_data)
             if alert_found:
@@ -289,7 +346,7 @@ class KreoAssistTester:
                 self.log_test("Alert in alerts list", False, "Emergency alert not found in alerts list")
         
         # Check if alert appears as latest unacknowledged
-        success, latest_data, status = self.make_request('GET', '/alerts/latest')
+        success, latest_data, status = await self.make_request('GET', '/alerts/latest')
         if success and status == 200 and latest_data:
             if latest_data.get('id') == alert_id:
                 self.log_test("Latest alert consistency", True, "Emergency alert is latest unacknowledged")
@@ -297,7 +354,7 @@ class KreoAssistTester:
                 self.log_test("Latest alert consistency", False, f"Latest alert ID {latest_data.get('id')} != expected {alert_id}")
         
         # Check if event was logged
-        success, events_data, status = self.make_request('GET', '/events')
+        success, events_data, status = await self.make_request('GET', '/events')
         if success and status == 200:
             emergency_event_found = any(
                 'EMERGENCY' in event.get('description', '') 
@@ -308,14 +365,13 @@ class KreoAssistTester:
             else:
                 self.log_test("Event logging consistency", False, "Emergency event not found in event log")
     
-    def test_edge_cases(self):
+    async def test_edge_cases(self):
         """Test edge cases and error handling"""
         print("\n=== Testing Edge Cases ===")
         
         # Test invalid JSON in POST requests
         try:
-            url = f"{self.base_url}/status"
-            response = self.session.post(url, data="invalid json", headers={'Content-Type': 'application/json'})
+            response = await self.client.post('/status', content="invalid json", headers={'Content-Type': 'application/json'})
             if response.status_code in [400, 422]:  # Bad request or unprocessable entity
                 self.log_test("Invalid JSON handling", True, f"Correctly rejected invalid JSON with status {response.status_code}")
             else:
@@ -325,31 +381,41 @@ class KreoAssistTester:
         
         # Test missing required fields
         incomplete_status = {"current_status": ""}  # Empty status
-        success, data, status = self.make_request('POST', '/status', incomplete_status)
+        success, data, status = await self.make_request('POST', '/status', incomplete_status)
         # This might pass depending on validation, so we just log the behavior
         self.log_test("Empty status field", True, f"Status {status}, handled empty status field")
     
-    def run_all_tests(self):
+    async def run_all_tests(self):
         """Run all test suites"""
         print("🚀 Starting KreoAssist Backend API Tests")
         print(f"Backend URL: {self.base_url}")
         print("=" * 60)
         
-        # Test basic connectivity
-        self.test_root_endpoint()
-        
-        # Test all endpoint categories
-        self.test_status_endpoints()
-        self.test_connection_endpoints()
-        self.test_alert_endpoints()
-        self.test_event_endpoints()
-        self.test_simulation_endpoints()
-        
-        # Test data consistency
-        self.test_data_flow_consistency()
-        
-        # Test edge cases
-        self.test_edge_cases()
+        try:
+            # Test basic connectivity
+            await self.test_root_endpoint()
+            
+            # Status, connection and event suites touch independent data. They
+            # run concurrently, so their results share one header
+            print("\n=== Testing Status, Connection and Event Endpoints ===")
+            await asyncio.gather(
+                self.test_status_endpoints(),
+                self.test_connection_endpoints(),
+                self.test_event_endpoints()
+            )
+            
+            # Alert and simulation suites both change the latest alert
+            await self.test_alert_endpoints()
+            await self.test_simulation_endpoints()
+            await self.test_stream_endpoints()
+            
+            # Test data consistency
+            await self.test_data_flow_consistency()
+            
+            # Test edge cases
+            await self.test_edge_cases()
+        finally:
+            await self.client.aclose()
         
         # Summary
         self.print_summary()
@@ -381,4 +447,4 @@ class KreoAssistTester:
 
 if __name__ == "__main__":
     tester = KreoAssistTester()
-    tester.run_all_tests()
\ No newline at end of file
+    asyncio.run(tester.run_all_tests())
\ No newline at end of file